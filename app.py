@@ -4,6 +4,7 @@ import streamlit as st
 import PyPDF2
 import hashlib
 from processor import ReceiptProcessor
+from router import ModelRouter, DOC_MODELS, classify_document, extract_with_model
 from datetime import datetime
 
 # Initialize session state
@@ -15,7 +16,8 @@ def init_session_state():
         'processing_stage': "upload",
         'duplicate_receipt': False,
         'file_type': None,
-        'file_hash': None
+        'file_hash': None,
+        'model_attempts': []
     }
     for key, value in session_vars.items():
         if key not in st.session_state:
@@ -81,6 +83,17 @@ processor = ReceiptProcessor(
     openai_api_key=st.secrets["OPENAI_API_KEY"]
 )
 
+# Model router is loaded once per process and shared across reruns and sessions
+@st.cache_resource
+def get_model_router():
+    return ModelRouter(
+        log_path=st.secrets.get("MODEL_STATS_PATH", "model_stats.jsonl"),
+        corpus_dir=st.secrets.get("MODEL_CORPUS_DIR", "model_corpus"),
+        accuracy_threshold=float(st.secrets.get("ROUTER_ACCURACY_THRESHOLD", 0.9))
+    )
+
+router = get_model_router()
+
 def reset_processing():
     st.session_state.current_receipt = None
     st.session_state.receipt_details = None
@@ -88,6 +101,7 @@ def reset_processing():
     st.session_state.duplicate_receipt = False
     st.session_state.file_type = None
     st.session_state.file_hash = None
+    st.session_state.model_attempts = []
     st.rerun()
 
 def sanitize_filename(text):
@@ -117,6 +131,50 @@ def get_file_extension(filename):
     """Extract file extension from filename"""
     return filename.lower().split('.')[-1] if '.' in filename else ""
 
+def routed_extraction(doc_type, input_data, file_type):
+    """Run an extraction with the routed model and remember the attempt for scoring"""
+    model = router.select_model(doc_type)
+    default_model = DOC_MODELS[doc_type][1]
+    models = [model] if model == default_model else [model, default_model]
+
+    for model in models:
+        extracted, latency, auto = extract_with_model(processor, input_data, file_type, model)
+        if extracted is None:
+            # Score failures now, the upload may never reach the verify step
+            router.record(doc_type, model, latency, None, None, file_type=file_type)
+            continue
+        st.session_state.model_attempts.append({
+            'doc_type': doc_type,
+            'model': model,
+            'latency': latency,
+            'extracted': extracted,
+            'auto': auto,
+            'input_data': input_data,
+            'file_type': file_type
+        })
+        return extracted
+    return None
+
+def record_model_attempts(verified_data):
+    """Score extraction attempts against the user's verified details"""
+    for attempt in st.session_state.model_attempts:
+        input_path = router.store_input(
+            st.session_state.file_hash,
+            attempt['input_data'],
+            attempt['file_type']
+        )
+        router.record(
+            attempt['doc_type'],
+            attempt['model'],
+            attempt['latency'],
+            attempt['extracted'],
+            verified_data,
+            input_path=input_path,
+            file_type=attempt['file_type'],
+            auto=attempt['auto']
+        )
+    st.session_state.model_attempts = []
+
 st.title("📄 Professional Receipt Processor")
 
 def verify_details(extracted_data):
@@ -193,6 +251,7 @@ if st.session_state.processing_stage == "upload":
         file_bytes = uploaded_file.read()
         st.session_state.current_receipt = file_bytes
         st.session_state.file_hash = hashlib.md5(file_bytes).hexdigest()
+        st.session_state.model_attempts = []
         file_extension = get_file_extension(uploaded_file.name)
         
         with st.spinner("Analyzing file type..."):
@@ -203,22 +262,24 @@ if st.session_state.processing_stage == "upload":
                 if file_extension == "pdf":
                     # Quick PDF content analysis to choose optimal method
                     has_text = analyze_pdf_content(file_bytes)
+                    doc_type = classify_document(file_extension, has_text)
                     
                     if has_text:
                         # Use cheaper text extraction for text-based PDFs
                         st.info("📄 Text PDF detected - extracting text efficiently...")
                         text_content = extract_text_from_pdf(file_bytes)
                         if text_content:
-                            extracted_data = processor.parse_receipt_text(text_content)
+                            extracted_data = routed_extraction(doc_type, text_content, "text")
                             processing_method = "text_extraction"
                         else:
                             st.warning("Text extraction failed, trying AI vision...")
-                            has_text = False
                     
-                    if not has_text or not extracted_data:
+                    if not extracted_data:
                         # Fallback to vision for image-based PDFs or failed text extraction
                         st.info("🖼️ Image PDF detected - using AI vision...")
-                        extracted_data = processor.parse_receipt_image(file_bytes, "pdf")
+                        # Keep text PDFs that fell back out of the scanned PDF stats
+                        vision_doc_type = "text_pdf_fallback" if has_text else doc_type
+                        extracted_data = routed_extraction(vision_doc_type, file_bytes, "pdf")
                         processing_method = "vision"
                 
                 else:
@@ -229,7 +290,9 @@ if st.session_state.processing_stage == "upload":
                     else:
                         file_type = file_extension
                     
-                    extracted_data = processor.parse_receipt_image(file_bytes, file_type)
+                    extracted_data = routed_extraction(
+                        classify_document(file_extension), file_bytes, file_type
+                    )
                     processing_method = "vision"
                     st.image(file_bytes, caption="Uploaded Receipt", use_container_width=True)
                 
@@ -268,6 +331,7 @@ elif st.session_state.processing_stage == "verify":
         verified_data = verify_details(st.session_state.receipt_details)
         
         if verified_data:
+            record_model_attempts(verified_data)
             st.session_state.receipt_details = verified_data
             st.session_state.processing_stage = "submit"
             st.rerun()
@@ -11,6 +11,9 @@ from datetime import datetime
 from dateutil import parser
 from oauth2client.service_account import ServiceAccountCredentials
 
+DEFAULT_TEXT_MODEL = "claude-3-haiku-20240307"
+DEFAULT_VISION_MODEL = "gpt-4o"
+
 class ReceiptProcessor:
     def __init__(self, anthropic_api_key, email_address, email_password, sheet_id, google_creds, openai_api_key=None):
         self.anthropic_headers = {
@@ -25,7 +28,8 @@ class ReceiptProcessor:
         self.email_password = email_password
         self.sheet_id = sheet_id
         self.google_creds = google_creds
-        self._init_google_sheets()
+        if google_creds:  # Optional for offline use such as replay.py
+            self._init_google_sheets()
 
     def _init_google_sheets(self):
         """Initialize Google Sheets connection"""
@@ -44,7 +48,7 @@ class ReceiptProcessor:
         text = re.sub(r'http[s]?://\S+', '', text)
         return text[:5000]  # Limit to first 5000 chars
 
-    def parse_receipt_text(self, text):
+    def parse_receipt_text(self, text, model=DEFAULT_TEXT_MODEL, raise_api_errors=False):
         """Parse receipt text using Anthropic API"""
         if not text.strip():
             return None
@@ -70,7 +74,7 @@ class ReceiptProcessor:
         Receipt text: """ + cleaned_text
 
         data = {
-            "model": "claude-3-haiku-20240307",
+            "model": model,
             "max_tokens": 500,
             "messages": [{"role": "user", "content": prompt}]
         }
@@ -96,12 +100,17 @@ class ReceiptProcessor:
                 "receipt_number": str(result.get("receipt_number", "")).strip()[:50] or 
                                  f"auto_{datetime.now().strftime('%Y%m%d%H%M%S')}"
             }
+        except requests.RequestException as e:
+            if raise_api_errors:
+                raise
+            print(f"API Error: {str(e)}")
+            return None
         except Exception as e:
             print(f"API Error: {str(e)}")
             return None
 
-    def parse_receipt_image(self, image_bytes, file_type="jpeg"):
-        """Parse receipt image using OpenAI GPT-4o-mini Vision API"""
+    def parse_receipt_image(self, image_bytes, file_type="jpeg", model=DEFAULT_VISION_MODEL, raise_api_errors=False):
+        """Parse receipt image using OpenAI Vision API (GPT-4o by default)"""
         if not self.openai_api_key:
             print("OpenAI API key not configured")
             return None
@@ -132,7 +141,7 @@ class ReceiptProcessor:
             }
 
             data = {
-                "model": "gpt-4o",
+                "model": model,
                 "messages": [
                     {
                         "role": "user",
@@ -171,6 +180,11 @@ class ReceiptProcessor:
                                  f"auto_{datetime.now().strftime('%Y%m%d%H%M%S')}"
             }
             
+        except requests.RequestException as e:
+            if raise_api_errors:
+                raise
+            print(f"OpenAI Vision API Error: {str(e)}")
+            return None
         except Exception as e:
             print(f"OpenAI Vision API Error: {str(e)}")
             return None
@@ -0,0 +1,155 @@
+"""Re-run candidate models over the stored receipt corpus and score them offline.
+
+Usage: python replay.py [model_stats.jsonl] [--models gpt-4o-mini ...] [--write]
+
+API keys are read from the ANTHROPIC_API_KEY and OPENAI_API_KEY environment variables.
+"""
+import os
+import argparse
+import requests
+from processor import ReceiptProcessor
+from router import (
+    DOC_MODELS, load_records, append_records, make_record, build_stats, summarize,
+    choose_model, count_corrections, extract_with_model, model_provider, doc_provider
+)
+
+API_KEY_VARS = {
+    "anthropic": "ANTHROPIC_API_KEY",
+    "openai": "OPENAI_API_KEY"
+}
+
+
+def load_corpus(log_path, doc_types=None):
+    """Return stored inputs with their latest verified labels"""
+    corpus = {}
+    for record in load_records(log_path):
+        input_path = record.get("input_path")
+        verified = record.get("verified") or {}
+        if record.get("origin", "live") != "live" or not input_path or not any(verified.values()):
+            continue
+        if record.get("doc_type") not in DOC_MODELS or not os.path.exists(input_path):
+            continue
+        if doc_types and record["doc_type"] not in doc_types:
+            continue
+        corpus[input_path] = {
+            "doc_type": record["doc_type"],
+            "file_type": record.get("file_type"),
+            "input_path": input_path,
+            "verified": verified,
+            "auto_fields": record.get("auto_fields") or []
+        }
+    return list(corpus.values())
+
+
+def read_input(entry):
+    """Read a corpus input as text or bytes depending on its file type"""
+    if entry["file_type"] == "text":
+        with open(entry["input_path"], encoding="utf-8") as f:
+            return f.read()
+    with open(entry["input_path"], "rb") as f:
+        return f.read()
+
+
+def candidate_models(doc_type, models=None):
+    """Return the models to replay for a class, limited to its provider when models are given"""
+    if not models:
+        return DOC_MODELS[doc_type][0]
+    return [model for model in models if model_provider(model) == doc_provider(doc_type)]
+
+
+def replay(processor, corpus, models=None):
+    """Run each candidate model over the corpus and return (new observation records, API errors)"""
+    records = []
+    api_errors = 0
+    for entry in corpus:
+        input_data = read_input(entry)
+        for model in candidate_models(entry["doc_type"], models):
+            try:
+                extracted, latency, auto = extract_with_model(
+                    processor, input_data, entry["file_type"], model, raise_api_errors=True
+                )
+            except requests.RequestException as e:
+                # Not the model's fault, keep it out of the stats
+                print(f"{os.path.basename(entry['input_path'])[:24]:<24} {model:<28} skipped: {str(e)[:80]}")
+                api_errors += 1
+                continue
+
+            # Fields auto-filled both live and on replay would differ only by timestamp
+            skip_fields = set(entry["auto_fields"]) & set(auto)
+            records.append(make_record(
+                entry["doc_type"], model, latency, extracted, entry["verified"],
+                input_path=entry["input_path"], file_type=entry["file_type"],
+                origin="replay", skip_fields=skip_fields
+            ))
+            corrections = count_corrections(extracted, entry["verified"], skip_fields)
+            print(f"{os.path.basename(entry['input_path'])[:24]:<24} {model:<28} "
+                  f"{latency:>6.2f}s {corrections} corrections")
+    return records, api_errors
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Replay the stored receipt corpus against candidate models")
+    arg_parser.add_argument("log", nargs="?", default="model_stats.jsonl")
+    arg_parser.add_argument("--models", nargs="*", help="Models to run, including ones not yet in the router's candidates")
+    arg_parser.add_argument("--doc-types", nargs="*", choices=sorted(DOC_MODELS), help="Only replay these classes")
+    arg_parser.add_argument("--threshold", type=float, default=0.9)
+    arg_parser.add_argument("--min-samples", type=int, default=5)
+    arg_parser.add_argument("--write", action="store_true", help="Append replay observations to the log")
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.log, args.doc_types)
+    if not corpus:
+        print(f"No stored inputs found in {args.log}")
+        return
+
+    doc_types = {entry["doc_type"] for entry in corpus}
+    if args.models:
+        unknown = [model for model in args.models if model_provider(model) is None]
+        if unknown:
+            arg_parser.error(f"unknown provider for models: {', '.join(unknown)}")
+        unmatched = [
+            model for model in args.models
+            if not any(model_provider(model) == doc_provider(doc_type) for doc_type in doc_types)
+        ]
+        if unmatched:
+            arg_parser.error(f"no stored inputs for the provider of: {', '.join(unmatched)}")
+
+    providers = {
+        model_provider(model)
+        for doc_type in doc_types
+        for model in candidate_models(doc_type, args.models)
+    }
+    missing = [API_KEY_VARS[provider] for provider in sorted(providers) if not os.environ.get(API_KEY_VARS[provider])]
+    if missing:
+        arg_parser.error(f"missing API keys: {', '.join(missing)}")
+
+    processor = ReceiptProcessor(
+        anthropic_api_key=os.environ.get("ANTHROPIC_API_KEY"),
+        email_address=None,
+        email_password=None,
+        sheet_id=None,
+        google_creds=None,
+        openai_api_key=os.environ.get("OPENAI_API_KEY")
+    )
+    records, api_errors = replay(processor, corpus, args.models)
+
+    stats = build_stats(records, window=max(len(records), 1))
+    print(f"\nReplayed {len(corpus)} inputs (threshold {args.threshold:.2f}, min samples {args.min_samples})")
+    if api_errors:
+        print(f"Skipped {api_errors} calls after API errors")
+    print(f"{'Class':<20} {'Model':<28} {'Samples':>7} {'Accuracy':>9} {'Latency':>8}")
+    for doc_type in sorted(stats):
+        chosen = choose_model(stats, doc_type, args.threshold, args.min_samples, candidates=list(stats[doc_type]))
+        for model, observations in sorted(stats[doc_type].items()):
+            accuracy, latency = summarize(observations)
+            marker = " *" if model == chosen else ""
+            print(f"{doc_type:<20} {model:<28} {len(observations):>7} "
+                  f"{accuracy:>9.1%} {latency:>7.2f}s{marker}")
+
+    if args.write:
+        append_records(args.log, records)
+        print(f"Wrote {len(records)} observations to {args.log}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from statistics import median
+from processor import DEFAULT_TEXT_MODEL, DEFAULT_VISION_MODEL
+
+# Candidate models per document type, cheapest/fastest first
+TEXT_MODELS = [
+    "claude-3-haiku-20240307",
+    "claude-3-5-haiku-20241022",
+    "claude-3-5-sonnet-20241022"
+]
+VISION_MODELS = [
+    "gpt-4o-mini",
+    "gpt-4o"
+]
+
+# text_pdf_fallback: text PDFs sent to vision after the text model failed
+DOC_MODELS = {
+    "text_pdf": (TEXT_MODELS, DEFAULT_TEXT_MODEL),
+    "text_pdf_fallback": (VISION_MODELS, DEFAULT_VISION_MODEL),
+    "scanned_pdf": (VISION_MODELS, DEFAULT_VISION_MODEL),
+    "photo": (VISION_MODELS, DEFAULT_VISION_MODEL)
+}
+
+# Fields the user can correct on the verify step
+SCORED_FIELDS = ["item", "cost", "date", "source", "receipt_number"]
+
+
+def classify_document(file_extension, has_text=False):
+    """Classify an upload as text_pdf, scanned_pdf or photo"""
+    if file_extension == "pdf":
+        return "text_pdf" if has_text else "scanned_pdf"
+    return "photo"
+
+
+def model_provider(model):
+    """Return the API provider serving a model name, or None if unknown"""
+    if model.startswith("claude"):
+        return "anthropic"
+    if model.startswith(("gpt-", "chatgpt", "o1", "o3", "o4")):
+        return "openai"
+    return None
+
+
+def doc_provider(doc_type):
+    """Return the API provider that handles a document class"""
+    return model_provider(DOC_MODELS[doc_type][1])
+
+
+def auto_fields(extracted, extracted_on):
+    """Return fields the processor filled in itself because the model gave no usable value"""
+    if not extracted:
+        return []
+    fields = []
+    if str(extracted.get("receipt_number", "")).startswith("auto_"):
+        fields.append("receipt_number")
+    if extracted.get("date") == extracted_on:  # _parse_date falls back to today
+        fields.append("date")
+    return fields
+
+
+def extract_with_model(processor, input_data, file_type, model, raise_api_errors=False):
+    """Run one extraction with the given model and return (result, latency, auto fields)"""
+    extracted_on = datetime.now().strftime("%Y-%m-%d")
+    start = time.perf_counter()
+    if file_type == "text":
+        result = processor.parse_receipt_text(input_data, model=model, raise_api_errors=raise_api_errors)
+    else:
+        result = processor.parse_receipt_image(input_data, file_type, model=model, raise_api_errors=raise_api_errors)
+    return result, time.perf_counter() - start, auto_fields(result, extracted_on)
+
+
+def _normalize_field(field, value):
+    """Normalize a field the same way the verify step formats it"""
+    value = str(value or "").strip()
+    if field == "item":
+        return ' '.join(value.split()[:2]).lower()
+    if field == "cost":
+        clean_cost = re.sub(r'[^\d.]', '', value) or "0"
+        try:
+            return f"{float(clean_cost):.2f}"
+        except ValueError:
+            return value
+    if field == "source":
+        return value.lower()
+    return value
+
+
+def count_corrections(extracted, verified, skip_fields=()):
+    """Count fields the user changed between extraction and verification"""
+    if not extracted:
+        return len(SCORED_FIELDS)
+    return sum(
+        1 for field in SCORED_FIELDS
+        if field not in skip_fields
+        and _normalize_field(field, extracted.get(field)) != _normalize_field(field, verified.get(field))
+    )
+
+
+def load_records(log_path):
+    """Load observation records from a JSON lines file"""
+    records = []
+    if not os.path.exists(log_path):
+        return records
+    try:
+        with open(log_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except Exception as e:
+        print(f"Model stats read error: {str(e)}")
+    return records
+
+
+def append_records(log_path, records):
+    """Append observation records to a JSON lines file"""
+    try:
+        with open(log_path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"Model stats write error: {str(e)}")
+
+
+def make_record(doc_type, model, latency, extracted, verified, input_path=None, file_type=None,
+                origin="live", auto=None, skip_fields=None):
+    """Build an observation record for the stats log"""
+    verified = verified or {}
+    # Auto-filled values the user kept; replay skips them when it auto-fills them too
+    kept_auto = [
+        field for field in (auto or [])
+        if extracted and _normalize_field(field, extracted.get(field)) == _normalize_field(field, verified.get(field))
+    ]
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "origin": origin,
+        "doc_type": doc_type,
+        "model": model,
+        "latency": round(latency, 3),
+        "input_path": input_path,
+        "file_type": file_type,
+        "extracted": extracted,
+        "verified": {field: verified.get(field) for field in SCORED_FIELDS},
+        "auto_fields": kept_auto,
+        "skip_fields": list(skip_fields or [])
+    }
+
+
+def add_to_stats(stats, record, window=50):
+    """Add one record to stats, keeping the most recent observations per class and model"""
+    doc_type = record.get("doc_type")
+    model = record.get("model")
+    if not doc_type or not model:
+        return
+    observations = stats.setdefault(doc_type, {}).setdefault(model, deque(maxlen=window))
+    observations.append((
+        count_corrections(record.get("extracted"), record.get("verified") or {}, record.get("skip_fields") or ()),
+        float(record.get("latency", 0))
+    ))
+
+
+def build_stats(records, window=50):
+    """Aggregate observation records into per-class, per-model stats"""
+    stats = {}
+    for record in records:
+        add_to_stats(stats, record, window)
+    return stats
+
+
+def summarize(observations):
+    """Return accuracy and median latency for a model's observations"""
+    if not observations:
+        return 0.0, 0.0
+    corrections = sum(c for c, _ in observations)
+    accuracy = 1 - corrections / (len(observations) * len(SCORED_FIELDS))
+    latency = median(l for _, l in observations)
+    return accuracy, latency
+
+
+def choose_model(stats, doc_type, accuracy_threshold=0.9, min_samples=5, candidates=None):
+    """Pick the fastest model meeting the accuracy threshold, or None"""
+    candidates = candidates or DOC_MODELS[doc_type][0]
+    class_stats = stats.get(doc_type, {})
+    qualified = []
+    for model in candidates:
+        observations = class_stats.get(model)
+        if not observations or len(observations) < min_samples:
+            continue
+        accuracy, latency = summarize(observations)
+        if accuracy >= accuracy_threshold:
+            qualified.append((latency, model))
+    return min(qualified)[1] if qualified else None
+
+
+class ModelRouter:
+    def __init__(self, log_path="model_stats.jsonl", corpus_dir="model_corpus",
+                 accuracy_threshold=0.9, min_samples=5, window=50,
+                 explore_rate=0.05, explore_floor=0.01):
+        self.log_path = log_path
+        self.corpus_dir = corpus_dir
+        self.accuracy_threshold = accuracy_threshold
+        self.min_samples = min_samples
+        self.window = window
+        self.explore_rate = explore_rate
+        self.explore_floor = explore_floor
+        self._lock = threading.Lock()
+        self.stats = build_stats(load_records(log_path), window)
+
+    def select_model(self, doc_type):
+        """Select a model for a document class"""
+        candidates, default = DOC_MODELS[doc_type]
+        with self._lock:
+            model = choose_model(
+                self.stats, doc_type,
+                accuracy_threshold=self.accuracy_threshold,
+                min_samples=self.min_samples
+            ) or default
+            class_stats = self.stats.get(doc_type, {})
+            others = [m for m in candidates if m != model]
+            undersampled = [
+                m for m in others
+                if len(class_stats.get(m, ())) < self.min_samples
+            ]
+
+        # Try models that lack enough recent samples, and keep re-checking the rest
+        if undersampled and random.random() < self.explore_rate:
+            return random.choice(undersampled)
+        if others and random.random() < self.explore_floor:
+            return random.choice(others)
+        return model
+
+    def store_input(self, file_hash, input_data, file_type):
+        """Save an extraction input to the corpus directory and return its path"""
+        suffix = "txt" if file_type == "text" else file_type
+        path = os.path.join(self.corpus_dir, f"{file_hash}.{suffix}")
+        try:
+            os.makedirs(self.corpus_dir, exist_ok=True)
+            if not os.path.exists(path):
+                if isinstance(input_data, str):
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(input_data)
+                else:
+                    with open(path, "wb") as f:
+                        f.write(input_data)
+            return path
+        except Exception as e:
+            print(f"Model corpus write error: {str(e)}")
+            return None
+
+    def record(self, doc_type, model, latency, extracted, verified, input_path=None, file_type=None, auto=None):
+        """Record one extraction outcome and update stats"""
+        record = make_record(
+            doc_type, model, latency, extracted, verified,
+            input_path=input_path, file_type=file_type, auto=auto
+        )
+        with self._lock:
+            append_records(self.log_path, [record])
+            add_to_stats(self.stats, record, self.window)